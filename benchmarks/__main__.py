@@ -0,0 +1,97 @@
+"""Runs the benchmark suites and saves the results as JSON.
+
+    python -m benchmarks
+    python -m benchmarks --suites objects load --clients 2000 --compare benchmarks/results/<earlier run>.json
+
+Results go to benchmarks/results/<timestamp>.json unless `--output` is given. With `--compare`,
+every number is printed next to the same number from the earlier run.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import pathlib
+import platform
+import subprocess
+import typing
+
+from benchmarks import load, objects, protocol
+
+RESULTS_DIR = pathlib.Path(__file__).parent / "results"
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output = True,
+                text = True,
+                check = True,
+                cwd = pathlib.Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(data: typing.Dict[str, typing.Any], prefix: str = "") -> typing.Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current: typing.Dict[str, typing.Any], previous: typing.Dict[str, typing.Any]):
+    before = flatten(previous["results"])
+    print(f"\n{'metric':<60} {'before':>14} {'after':>14} {'change':>9}")
+    for key, value in flatten(current["results"]).items():
+        if key not in before:
+            continue
+        change = f"{(value - before[key]) / before[key] * 100:+.1f}%" if before[key] else "n/a"
+        print(f"{key:<60} {before[key]:>14.2f} {value:>14.2f} {change:>9}")
+
+
+def run(args: argparse.Namespace) -> typing.Dict[str, typing.Any]:
+    results = {}
+    if "objects" in args.suites:
+        results["objects"] = objects.run()
+        objects.report(results["objects"])
+    if "load" in args.suites:
+        results["load"] = asyncio.run(load.run(args.clients, args.duration, args.interval, args.mode, args.rate_limit))
+        load.report(results["load"])
+    if "protocol" in args.suites:
+        results["protocol"] = asyncio.run(protocol.run(args.players, args.duration, args.interval))
+        protocol.report(results["protocol"])
+    return {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec = "seconds"),
+            "commit"   : git_commit(),
+            "python"   : platform.python_version(),
+            "platform" : platform.platform(),
+            "args"     : vars(args) | {"output": str(args.output), "compare": str(args.compare)},
+            "results"  : results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs = "+", choices = ("objects", "load", "protocol"),
+                        default = ["objects", "load", "protocol"])
+    parser.add_argument("--clients", type = int, default = 1000, help = "clients for the load suite")
+    parser.add_argument("--players", type = int, default = 50, help = "players for the protocol suite")
+    parser.add_argument("--duration", type = float, default = 10.0)
+    parser.add_argument("--interval", type = float, default = 1.0)
+    parser.add_argument("--mode", choices = load.MODES, default = "closed", help = "client loop for the load suite")
+    parser.add_argument("--rate-limit", type = float, help = "server rate limit for the load suite, unlimited by default")
+    parser.add_argument("--output", type = pathlib.Path)
+    parser.add_argument("--compare", type = pathlib.Path)
+    args = parser.parse_args()
+
+    data = run(args)
+    output = args.output or RESULTS_DIR / f"{data['timestamp'].replace(':', '-')}.json"
+    output.parent.mkdir(parents = True, exist_ok = True)
+    output.write_text(json.dumps(data, indent = 4))
+    print(f"\nResults saved to {output}")
+    if args.compare:
+        compare(data, json.loads(args.compare.read_text()))
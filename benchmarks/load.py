@@ -0,0 +1,157 @@
+"""Load generator, opens many websocket clients against an in-process MudServer.
+
+    python -m benchmarks.load --clients 2000 --duration 10
+    python -m benchmarks.load --clients 2000 --mode open --interval 1 --rate-limit 5
+
+In the default closed loop mode each client sends its next command as soon as the previous one is
+answered, so `commands_per_sec` is what the server manages to get through. In open loop mode each
+client sleeps out the rest of `--interval` after every response, which gives latencies at a fixed
+offered load. The server's rate limit is off unless `--rate-limit` is given.
+Clients and server share the process, so the memory figures cover both sides of every connection.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import resource
+import statistics
+import time
+import typing
+
+import websockets
+
+from game.mechanics import dice
+from game.objects.world import Item, Player, Room
+from game.server import MudServer
+
+COMMANDS = ("look", "roll 3 d6", "who", "nope")
+MODES = ("closed", "open")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20
+
+
+def raise_fd_limit(clients: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = clients * 2 + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+
+def build_server(rate_limit: float | None = None) -> MudServer:
+    server = MudServer("127.0.0.1", 0, rate_limit = rate_limit)
+    room = Room()
+    contents = {}
+    for cat, cls, count in (("players", Player, 5), ("items", Item, 5)):
+        for _ in range(count):
+            obj = cls()
+            contents[obj.uuid] = obj
+            room.add(cat, obj)
+
+    @server.command("look")
+    async def look(server: MudServer, client_name, message, args):
+        return room.long_description(lambda cat, uuid: contents[uuid])
+
+    @server.command("roll")
+    async def roll(server: MudServer, client_name, message, args):
+        return f"You roll {sum(dice.roll_many(args[0], args[1]))}"
+
+    @server.command("who")
+    async def who(server: MudServer, client_name, message, args):
+        return f"{len(server.get_client_names())} players online"
+
+    return server
+
+
+async def run_client(
+        port: int,
+        name: str,
+        mode: str,
+        interval: float,
+        start: asyncio.Event,
+        deadline: typing.Callable[[], float],
+        connecting: asyncio.Semaphore,
+        latencies: typing.List[float],
+):
+    async with connecting:
+        client = await websockets.connect(f"ws://127.0.0.1:{port}", open_timeout = None)
+    try:
+        await client.send(name)
+        await start.wait()
+        if mode == "open":
+            await asyncio.sleep(random.uniform(0, interval))
+        for command in itertools.cycle(COMMANDS):
+            sent = time.perf_counter()
+            if sent >= deadline():
+                break
+            await client.send(command)
+            await client.recv()
+            latencies.append(time.perf_counter() - sent)
+            if mode == "open":
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - sent)))
+    finally:
+        await client.close()
+
+
+async def run(
+        clients: int = 1000,
+        duration: float = 10.0,
+        interval: float = 1.0,
+        mode: str = "closed",
+        rate_limit: float | None = None,
+) -> typing.Dict[str, float]:
+    if mode not in MODES:
+        raise ValueError(f"Invalid load mode {mode!r}")
+    raise_fd_limit(clients)
+    server = build_server(rate_limit)
+    latencies: typing.List[float] = []
+    start = asyncio.Event()
+    connecting = asyncio.Semaphore(100)
+    started = [0.0]
+    rss_before = rss_mb()
+    async with server.serve() as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        tasks = [
+                asyncio.create_task(run_client(
+                        port, f"player{i}", mode, interval, start, lambda: started[0] + duration, connecting, latencies
+                ))
+                for i in range(clients)
+        ]
+        while len(server.clients) < clients and not any(task.done() for task in tasks):
+            await asyncio.sleep(0.05)
+        rss_connected = rss_mb()
+        started[0] = time.perf_counter()
+        start.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started[0]
+    percentiles = statistics.quantiles(latencies, n = 100) if len(latencies) > 1 else [0.0] * 99
+    return {
+            "clients"           : clients,
+            "commands"          : len(latencies),
+            "commands_per_sec"  : len(latencies) / elapsed,
+            "latency_p50_ms"    : percentiles[49] * 1e3,
+            "latency_p90_ms"    : percentiles[89] * 1e3,
+            "latency_p99_ms"    : percentiles[98] * 1e3,
+            "latency_max_ms"    : max(latencies, default = 0.0) * 1e3,
+            "rss_mb"            : rss_connected,
+            "rss_per_client_kb" : (rss_connected - rss_before) * 1024 / clients,
+            "peak_rss_mb"       : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def report(result: typing.Dict[str, float]):
+    for key, value in result.items():
+        print(f"{key:<20} {value:>12.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type = int, default = 1000)
+    parser.add_argument("--duration", type = float, default = 10.0)
+    parser.add_argument("--interval", type = float, default = 1.0, help = "seconds between commands in open loop mode")
+    parser.add_argument("--mode", choices = MODES, default = "closed")
+    parser.add_argument("--rate-limit", type = float, help = "commands per second per client, unlimited by default")
+    args = parser.parse_args()
+    report(asyncio.run(run(args.clients, args.duration, args.interval, args.mode, args.rate_limit)))
@@ -0,0 +1,75 @@
+"""Micro benchmarks for the object model and the server helpers, none of them touch the database.
+
+    python -m benchmarks.objects
+"""
+import timeit
+import typing
+
+from game.mechanics import dice
+from game.mechanics.flags import ObjectInteraction
+from game.objects.base import BaseObject
+from game.objects.world import Creature, Item, Player, Room
+from game.server import MudServer
+
+Result = typing.Dict[str, float]
+
+
+def measure(func: typing.Callable[[], typing.Any], repeat: int = 5) -> Result:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat = repeat, number = number)) / number
+    return {"ops_per_sec": 1 / best, "us_per_op": best * 1e6}
+
+
+def build_room() -> typing.Tuple[Room, typing.Dict[str, BaseObject]]:
+    room = Room()
+    contents = {}
+    for cat, cls, count in (("creatures", Creature, 3), ("players", Player, 5), ("items", Item, 10)):
+        for _ in range(count):
+            obj = cls()
+            contents[obj.uuid] = obj
+            room.add(cat, obj)
+    room.exits = {"north": Room().uuid, "south": Room().uuid, "east": Room().uuid}
+    return room, contents
+
+
+def build_server() -> MudServer:
+    server = MudServer("127.0.0.1", 0)
+    for name in ("look", "go", "say", "shout", "get", "drop", "inventory", "inspect", "attack", "flee", "who", "quit"):
+        server.commands[name] = None
+    return server
+
+
+def benchmarks() -> typing.Dict[str, typing.Callable[[], typing.Any]]:
+    room, contents = build_room()
+    lookup = lambda cat, uuid: contents[uuid]
+    player = Player()
+    state = player.to_dict(show_private = True)
+    server = build_server()
+    return {
+            "to_dict"                  : lambda: player.to_dict(show_private = True),
+            "from_dict"                : lambda: BaseObject.from_dict(state),
+            "to_dict_from_dict"        : lambda: BaseObject.from_dict(player.to_dict(show_private = True)),
+            "setattr_plain"            : lambda: setattr(player, "player_name", "bench"),
+            "setattr_to_type"          : lambda: setattr(player, "allowed_interactions", ObjectInteraction.INSPECT),
+            "inspect_short_description": lambda: player.inspect(),
+            "inspect_by_name"          : lambda: player.inspect("self_description"),
+            "room_long_description"    : lambda: room.long_description(lookup),
+            "get_closest_commands"     : lambda: server.get_closest_commands("lok"),
+            "dice_d20"                 : lambda: dice.d20(),
+            "dice_roll_many_10d6"      : lambda: dice.roll_many(10, "d6"),
+    }
+
+
+def run(repeat: int = 5) -> typing.Dict[str, Result]:
+    return {name: measure(func, repeat) for name, func in benchmarks().items()}
+
+
+def report(results: typing.Dict[str, Result]):
+    print(f"{'benchmark':<28} {'ops/sec':>14} {'us/op':>10}")
+    for name, result in results.items():
+        print(f"{name:<28} {result['ops_per_sec']:>14.0f} {result['us_per_op']:>10.2f}")
+
+
+if __name__ == '__main__':
+    report(run())
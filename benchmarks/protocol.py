@@ -0,0 +1,133 @@
+"""Compares the wire protocols by the frames and bytes the clients receive.
+
+    python -m benchmarks.protocol --players 50 --duration 10
+
+Every player sends a command each `--interval` seconds, alternating between a `say` that is
+broadcast to everyone and a `look` that answers with the room description.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+import typing
+
+import websockets
+import websockets.client
+
+from game.objects.world import Item, Room
+from game.server import MudServer
+from game.system import protocol
+
+SCENARIOS = {
+        "text"        : (None, None),
+        "text+deflate": (None, protocol.DEFAULT_DEFLATE),
+        "json"        : (protocol.JSON_PROTOCOL, None),
+        "json+deflate": (protocol.JSON_PROTOCOL, protocol.DEFAULT_DEFLATE),
+}
+
+
+class CountingClientProtocol(websockets.client.WebSocketClientProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wire_bytes = 0
+
+    def data_received(self, data: bytes):
+        self.wire_bytes += len(data)
+        super().data_received(data)
+
+
+def build_server(deflate: protocol.DeflateSettings | None) -> MudServer:
+    server = MudServer("127.0.0.1", 0, rate_limit = None, deflate = deflate)
+    room = Room()
+    room.name = "a neon lit alley"
+    items = {}
+    for _ in range(5):
+        item = Item()
+        items[item.uuid] = item
+        room.add("items", item)
+    room.exits = {"north": Room().uuid, "south": Room().uuid}
+
+    @server.command("say")
+    async def say(server: MudServer, client_name, message, args):
+        server.broadcast_message(f"{client_name} says {' '.join(args)}")
+        return f"You say {' '.join(args)}"
+
+    @server.command("look")
+    async def look(server: MudServer, client_name, message, args):
+        # the same description in both modes, so only the framing differs between scenarios
+        return {"type": "room", "text": room.long_description(lambda cat, uuid: items[uuid])}
+
+    return server
+
+
+async def run_client(
+        port: int,
+        name: str,
+        subprotocol: str | None,
+        interval: float,
+        deadline: float,
+        frames: typing.List[int],
+) -> int:
+    async with websockets.connect(
+            f"ws://127.0.0.1:{port}",
+            subprotocols = [subprotocol] if subprotocol else None,
+            create_protocol = CountingClientProtocol,
+    ) as client:
+        await client.send(name)
+
+        async def read():
+            async for _ in client:
+                frames[0] += 1
+
+        reader = asyncio.create_task(read())
+        await asyncio.sleep(random.uniform(0, interval))
+        for command in itertools.cycle(("say hello there", "look")):
+            if time.monotonic() >= deadline:
+                break
+            await client.send(command)
+            await asyncio.sleep(interval)
+        reader.cancel()
+        return client.wire_bytes
+
+
+async def run_scenario(name: str, players: int, duration: float, interval: float) -> typing.Dict[str, float]:
+    subprotocol, deflate = SCENARIOS[name]
+    server = build_server(deflate)
+    frames = [0]
+    async with server.serve() as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        deadline = time.monotonic() + duration
+        wire_bytes = await asyncio.gather(*(
+                run_client(port, f"player{i}", subprotocol, interval, deadline, frames)
+                for i in range(players)
+        ))
+    return {
+            "frames_per_sec"          : frames[0] / duration,
+            "bytes_per_player_per_min": sum(wire_bytes) / players / duration * 60,
+    }
+
+
+async def run(
+        players: int = 50,
+        duration: float = 5.0,
+        interval: float = 1.0,
+        scenarios: typing.Iterable[str] = SCENARIOS,
+) -> typing.Dict[str, typing.Dict[str, float]]:
+    return {name: await run_scenario(name, players, duration, interval) for name in scenarios}
+
+
+def report(results: typing.Dict[str, typing.Dict[str, float]]):
+    print(f"{'scenario':<14} {'frames/sec':>12} {'bytes/player/min':>18}")
+    for name, result in results.items():
+        print(f"{name:<14} {result['frames_per_sec']:>12.1f} {result['bytes_per_player_per_min']:>18.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type = int, default = 50)
+    parser.add_argument("--duration", type = float, default = 5.0)
+    parser.add_argument("--interval", type = float, default = 1.0)
+    parser.add_argument("--scenarios", nargs = "+", choices = SCENARIOS, default = list(SCENARIOS))
+    args = parser.parse_args()
+    report(asyncio.run(run(args.players, args.duration, args.interval, args.scenarios)))
@@ -156,11 +156,11 @@ class BaseObject:
                 data[field.name] = v
         return data
 
-    def to_json(self, *keys, show_private = False):
+    def to_json(self, *keys, show_private = False, indent = None):
         return json.dumps(self.to_dict(
                 *keys,
                 show_private = show_private
-        ), indent = 4)
+        ), indent = indent, separators = None if indent else (",", ":"))
 
 
 T = typing.TypeVar("T", bound = BaseObject, covariant = True)
@@ -1,19 +1,26 @@
 import asyncio
+import contextlib
+import logging
 import typing
 
 import websockets
 import websockets.exceptions
 
+from game.system import protocol
+from game.system.scheduler import FairScheduler, Session
 from game.system.utils import levenshtein_distance
 
 ClientName = str
 ClientMessage = str
-ServerResponse = str
+ServerResponse = str | protocol.Message
 
 CommandArgs = typing.Tuple[str, ...]
 ServerCommand = typing.Callable[["MudServer", ClientName, ClientMessage, CommandArgs], ServerResponse]
 Clients = typing.Dict[ClientName, websockets.WebSocketServerProtocol]
 Commands = typing.Dict[str, ServerCommand]
+Outboxes = typing.Dict[ClientName, typing.List[protocol.Message]]
+
+logger = logging.getLogger(__name__)
 
 
 # noinspection PyTypeChecker
@@ -22,26 +29,99 @@ class MudServer:
             self,
             host: str,
             port: int,
+            *,
+            queue_size: int = 32,
+            max_in_flight: int = 4,
+            rate_limit: float | None = 5.0,
+            burst: int = 10,
+            flush_interval: float | None = 0.05,
+            deflate: protocol.DeflateSettings | None = protocol.DEFAULT_DEFLATE,
     ):
         self.host = host
         self.port = port
+        self.flush_interval = flush_interval
+        self.deflate = deflate
         self.clients: Clients = {}
+        self.outboxes: Outboxes = {}
         self.commands: Commands = {}
-        self.loop = asyncio.get_event_loop()
+        self.ordered_commands: typing.Set[str] = set()
+        self.scheduler = FairScheduler(
+                self.dispatch,
+                is_ordered = self.is_ordered,
+                queue_size = queue_size,
+                max_in_flight = max_in_flight,
+                rate = rate_limit,
+                burst = burst,
+        )
 
     async def start(self):
-        async with websockets.serve(self.handle_client, self.host, self.port):
-            self.loop.run_forever()
+        async with self.serve():
+            await asyncio.Future()
+
+    @contextlib.asynccontextmanager
+    async def serve(self):
+        async with websockets.serve(
+                self.handle_client,
+                self.host,
+                self.port,
+                compression = None,
+                extensions = protocol.deflate_extensions(self.deflate),
+                subprotocols = protocol.SUBPROTOCOLS,
+        ) as server:
+            self.scheduler.start()
+            flusher = asyncio.get_running_loop().create_task(self.flush_forever()) if self.flush_interval else None
+            try:
+                yield server
+            finally:
+                self.scheduler.stop()
+                if flusher is not None:
+                    flusher.cancel()
 
     async def handle_client(self, client: websockets.WebSocketServerProtocol, path: str):
-        client_name = await client.recv()
+        # this coroutine is the session's reader, commands are run by the scheduler
+        client_name = protocol.decode_command(await client.recv())
+        if client_name in self.clients:
+            await client.close(reason = "That name is already taken.")
+            return
         self.clients[client_name] = client
+        if client.subprotocol == protocol.JSON_PROTOCOL:
+            self.outboxes[client_name] = []
+        session = self.scheduler.register(client_name, client)
         try:
+            await self.on_connect(client_name)
             while True:
-                message = await client.recv()
-                await client.send(await self.handle_message(client_name, message))
+                message = protocol.decode_command(await client.recv())
+                await self.scheduler.submit(session, message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.clients.pop(client_name, None)
+            self.outboxes.pop(client_name, None)
+            self.scheduler.unregister(session)
+            await self.on_disconnect(client_name)
+
+    async def on_connect(self, client_name: ClientName):
+        """Called once a client has sent its name, before any of its commands are read"""
+
+    async def on_disconnect(self, client_name: ClientName):
+        """Called after a client's connection has closed"""
+
+    async def dispatch(self, session: Session, message: ClientMessage):
+        try:
+            response = await self.handle_message(session.name, message)
+        except Exception:
+            logger.exception(f"Command {message!r} from {session.name} failed")
+            response = "Something went wrong."
+        if (outbox := self.outboxes.get(session.name)) is not None:
+            outbox.append(protocol.structure(response, "response"))
+            return
+        try:
+            await session.client.send(protocol.render_text(response))
         except websockets.exceptions.ConnectionClosed:
-            del self.clients[client_name]
+            pass
+
+    def is_ordered(self, message: ClientMessage) -> bool:
+        return message.split(" ", 1)[0] in self.ordered_commands
 
     async def handle_message(self, client_name: ClientName, message: ClientMessage) -> ServerResponse:
         command, *args = message.split(" ")
@@ -53,19 +133,48 @@ class MudServer:
     def get_closest_commands(self, command: str) -> typing.List[str]:
         return sorted(self.commands.keys(), key = lambda c: levenshtein_distance(command, c))[:5]
 
-    def command(self, name: str):
+    def command(self, name: str, ordered: bool = False):
+        """Registers a command, ordered commands never overlap with other commands from the same client"""
         def wrapper(func: ServerCommand):
             self.commands[name] = func
+            if ordered:
+                self.ordered_commands.add(name)
+            else:
+                self.ordered_commands.discard(name)
             return func
 
         return wrapper
 
-    def send_message(self, client_name: ClientName, message: ServerResponse):
-        self.loop.create_task(self.clients[client_name].send(message))
+    def send_message(self, client_name: ClientName, message: ServerResponse, type: str = "message"):
+        """Structured clients get the message with their next flush, plain text clients get it straight away"""
+        if (outbox := self.outboxes.get(client_name)) is not None:
+            outbox.append(protocol.structure(message, type))
+        else:
+            asyncio.get_running_loop().create_task(self.send_frame(self.clients[client_name], protocol.render_text(message)))
 
     def broadcast_message(self, message: ServerResponse):
-        for client in self.clients.values():
-            self.loop.create_task(client.send(message))
+        for client_name in self.get_client_names():
+            self.send_message(client_name, message, "broadcast")
+
+    def flush(self, client_name: ClientName = None):
+        """Sends everything queued for structured clients, one frame per client"""
+        for name in (client_name,) if client_name is not None else tuple(self.outboxes):
+            if (outbox := self.outboxes.get(name)) and name in self.clients:
+                frame = protocol.encode(outbox)
+                outbox.clear()
+                asyncio.get_running_loop().create_task(self.send_frame(self.clients[name], frame))
+
+    @staticmethod
+    async def send_frame(client: websockets.WebSocketServerProtocol, frame: str):
+        try:
+            await client.send(frame)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
 
     def get_client_names(self) -> typing.List[ClientName]:
         return list(self.clients.keys())
@@ -0,0 +1,447 @@
+import asyncio
+import contextlib
+import inspect
+import itertools
+import logging
+import multiprocessing
+import pickle
+import socket
+import typing
+import zlib
+
+from game.objects.base import BaseObject, search_subs_from_resolved_name
+from game.objects.mixins import BasicObject
+from game.objects.world import Player, Room
+from game.server import ClientMessage, ClientName, CommandArgs, MudServer, ServerResponse
+
+RoomId = str
+ShardId = int
+ObjectState = typing.Dict[str, typing.Any]
+Placement = typing.Dict[RoomId, ShardId]
+
+ShardCommand = typing.Callable[["ShardWorker", ClientName, ClientMessage, CommandArgs], ServerResponse]
+
+# gateway -> worker: (kind, request_id, client_name, room_id, payload), None asks the worker to stop
+# worker -> gateway: (request_id, response, room_id, handoff_state), room_id is None when the request failed
+ShardRequest = typing.Tuple[str, int, ClientName, RoomId | None, typing.Any]
+ShardReply = typing.Tuple[int, ServerResponse, RoomId | None, ObjectState | None]
+
+logger = logging.getLogger(__name__)
+
+
+class ShardError(Exception):
+    """Raised when a shard can't be reached or couldn't carry out a request"""
+
+
+def object_state(obj: BaseObject) -> ObjectState:
+    return obj.to_dict(show_private = True)
+
+
+def restore_object(state: ObjectState) -> BaseObject:
+    """Rebuilds an object from `object_state`, unlike `from_dict` this keeps non-init fields such as the uuid"""
+    obj = search_subs_from_resolved_name(BaseObject, state["resolved_name"])()
+    obj.__setstate__({k: v for k, v in state.items() if k in obj.field_names})
+    return obj
+
+
+def partition_rooms(rooms: typing.Iterable[Room], shards: int) -> Placement:
+    """Spreads rooms over shards by a stable hash of their uuid"""
+    return {room.uuid: zlib.crc32(room.uuid.encode()) % shards for room in rooms}
+
+
+async def read_message(reader: asyncio.StreamReader) -> typing.Any:
+    size = int.from_bytes(await reader.readexactly(4), "big")
+    return pickle.loads(await reader.readexactly(size))
+
+
+async def write_message(writer: asyncio.StreamWriter, message: typing.Any):
+    data = pickle.dumps(message)
+    writer.write(len(data).to_bytes(4, "big") + data)
+    await writer.drain()
+
+
+class ShardWorker:
+    """Owns a partition of the rooms and everything in them, runs inside a worker process.
+
+    Commands are registered on the class with `ShardWorker.command` and are called with the worker,
+    the client name, the raw message and its arguments, just like `MudServer` commands. A command
+    moves a player by calling `move`; if the destination room belongs to another shard the player is
+    removed here and handed back to the gateway, which passes it on to the owning shard. Commands
+    that move players must be registered as ordered, the gateway relies on that to track handoffs.
+    """
+    commands: typing.Dict[str, ShardCommand] = {}
+    ordered_commands: typing.Set[str] = set()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.commands = dict(cls.commands)
+        cls.ordered_commands = set(cls.ordered_commands)
+
+    def __init__(
+            self,
+            shard_id: ShardId,
+            rooms: typing.Iterable[ObjectState],
+            objects: typing.Iterable[ObjectState] = (),
+            placement: Placement = None,
+    ):
+        self.shard_id = shard_id
+        self.rooms: typing.Dict[RoomId, Room] = {}
+        self.objects: typing.Dict[str, BasicObject] = {}
+        self.players: typing.Dict[ClientName, Player] = {}
+        self.locations: typing.Dict[ClientName, RoomId] = {}
+        for state in rooms:
+            room = restore_object(state)
+            self.rooms[room.uuid] = room
+        for state in objects:
+            obj = restore_object(state)
+            self.objects[obj.uuid] = obj
+        self.placement = placement if placement is not None else dict.fromkeys(self.rooms, shard_id)
+
+    @classmethod
+    def command(cls, name: str, ordered: bool = False):
+        def wrapper(func: ShardCommand):
+            cls.commands[name] = func
+            if ordered:
+                cls.ordered_commands.add(name)
+            else:
+                cls.ordered_commands.discard(name)
+            return func
+
+        return wrapper
+
+    def lookup(self, category: str, uuid: str) -> BasicObject:
+        return self.objects[uuid]
+
+    def room_of(self, client_name: ClientName) -> Room:
+        return self.rooms[self.locations[client_name]]
+
+    def describe(self, client_name: ClientName) -> ServerResponse:
+        return self.room_of(client_name).long_description(self.lookup)
+
+    def move(self, client_name: ClientName, room_id: RoomId):
+        if room_id not in self.placement:
+            raise ValueError(f"Invalid room {room_id}")
+        player = self.players[client_name]
+        self.room_of(client_name).remove("players", player)
+        self.locations[client_name] = room_id
+        if room_id in self.rooms:
+            self.rooms[room_id].add("players", player)
+
+    def enter(self, client_name: ClientName, room_id: RoomId, state: ObjectState) -> ServerResponse:
+        player = restore_object(state)
+        self.rooms[room_id].add("players", player)
+        self.players[client_name] = player
+        self.objects[player.uuid] = player
+        self.locations[client_name] = room_id
+        return self.describe(client_name)
+
+    def leave(self, client_name: ClientName) -> ObjectState:
+        player = self.players.pop(client_name)
+        room_id = self.locations.pop(client_name)
+        if room_id in self.rooms and player.uuid in self.rooms[room_id].players:
+            self.rooms[room_id].remove("players", player)
+        del self.objects[player.uuid]
+        return object_state(player)
+
+    async def handle_command(self, client_name: ClientName, message: ClientMessage) -> ServerResponse:
+        if client_name not in self.players:
+            return "You are not here."
+        command, *args = message.split(" ")
+        if command not in self.commands:
+            return f"Command not found: {command}"
+        response = self.commands[command](self, client_name, message, args)
+        if inspect.isawaitable(response):
+            response = await response
+        return response
+
+    async def handle_request(self, request: ShardRequest) -> ShardReply:
+        kind, request_id, client_name, room_id, payload = request
+        match kind:
+            case "enter":
+                return request_id, self.enter(client_name, room_id, payload), room_id, None
+            case "leave":
+                return request_id, "", None, self.leave(client_name) if client_name in self.players else None
+            case "command":
+                response = await self.handle_command(client_name, payload)
+                room_id = self.locations.get(client_name)
+                if room_id is not None and room_id not in self.rooms:
+                    return request_id, response, room_id, self.leave(client_name)
+                return request_id, response, room_id, None
+            case _:
+                raise ValueError(f"Invalid shard request {kind}")
+
+    async def respond(self, writer: asyncio.StreamWriter, request: ShardRequest):
+        try:
+            reply = await self.handle_request(request)
+        except Exception:
+            logger.exception(f"Shard {self.shard_id} failed to handle {request[0]!r} for {request[2]}")
+            reply = request[1], "Something went wrong.", None, None
+        with contextlib.suppress(ConnectionError):
+            await write_message(writer, reply)
+
+    async def serve(self, sock: socket.socket):
+        reader, writer = await asyncio.open_connection(sock = sock)
+        tasks = set()
+        try:
+            while (request := await read_message(reader)) is not None:
+                task = asyncio.get_running_loop().create_task(self.respond(writer, request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@ShardWorker.command("look")
+def look(worker: ShardWorker, client_name: ClientName, message: ClientMessage, args: CommandArgs) -> ServerResponse:
+    return worker.describe(client_name)
+
+
+@ShardWorker.command("go", ordered = True)
+def go(worker: ShardWorker, client_name: ClientName, message: ClientMessage, args: CommandArgs) -> ServerResponse:
+    exits = worker.room_of(client_name).exits
+    if not args or args[0] not in exits:
+        return f"You can't go that way. Exits: {', '.join(exits) or 'none'}"
+    if exits[args[0]] not in worker.placement:
+        return "That way leads nowhere."
+    worker.move(client_name, exits[args[0]])
+    return f"You go {args[0]}."
+
+
+def run_worker(
+        worker_cls: typing.Type[ShardWorker],
+        shard_id: ShardId,
+        sock: socket.socket,
+        inherited: typing.List[socket.socket],
+        placement: Placement,
+        rooms: typing.List[ObjectState],
+        objects: typing.List[ObjectState],
+):
+    # a forked worker holds copies of the gateway's socket ends, left open it would never see the gateway die
+    for gateway_sock in inherited:
+        gateway_sock.close()
+    asyncio.run(worker_cls(shard_id, rooms, objects, placement).serve(sock))
+
+
+class ShardedMudServer(MudServer):
+    """Gateway that holds the websocket connections and forwards commands to the shard owning the player's room.
+
+    Rooms are placed on `shards` worker processes, each running its own event loop and talking to
+    the gateway over a socket pair. Commands registered on the gateway itself with `command` still
+    run here, everything else is routed.
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: int,
+            rooms: typing.Iterable[Room],
+            *,
+            spawn_room: RoomId,
+            objects: typing.Iterable[BasicObject] = (),
+            shards: int = 2,
+            placement: Placement = None,
+            worker_cls: typing.Type[ShardWorker] = ShardWorker,
+            mp_context: multiprocessing.context.BaseContext = None,
+            request_timeout: float = 10.0,
+            **kwargs
+    ):
+        super().__init__(host, port, **kwargs)
+        rooms = list(rooms)
+        self.shard_count = shards
+        self.placement = placement or partition_rooms(rooms, shards)
+        if spawn_room not in self.placement:
+            raise ValueError(f"Invalid spawn room {spawn_room}")
+        self.spawn_room = spawn_room
+        self.worker_cls = worker_cls
+        self.mp_context = mp_context or multiprocessing.get_context()
+        self.request_timeout = request_timeout
+        self.ordered_commands |= worker_cls.ordered_commands
+        self.locations: typing.Dict[ClientName, RoomId] = {}
+        self.processes: typing.List[multiprocessing.Process] = []
+        self.writers: typing.List[asyncio.StreamWriter] = []
+        self._readers: typing.List[asyncio.Task] = []
+        self._pending: typing.List[typing.Dict[int, asyncio.Future]] = [{} for _ in range(shards)]
+        self._down: typing.Set[ShardId] = set()
+        self._moving: typing.Dict[ClientName, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._shard_rooms: typing.List[typing.List[ObjectState]] = [[] for _ in range(shards)]
+        self._shard_objects: typing.List[typing.List[ObjectState]] = [[] for _ in range(shards)]
+        owners = {}
+        for room in rooms:
+            shard_id = self.placement[room.uuid]
+            self._shard_rooms[shard_id].append(object_state(room))
+            for attr in ("creatures", "objects", "items"):
+                owners.update(dict.fromkeys(getattr(room, attr), shard_id))
+        for obj in objects:
+            if obj.uuid in owners:
+                self._shard_objects[owners[obj.uuid]].append(object_state(obj))
+
+    async def start_shards(self):
+        gateway_socks = []
+        for shard_id in range(self.shard_count):
+            parent_sock, child_sock = socket.socketpair()
+            gateway_socks.append(parent_sock)
+            process = self.mp_context.Process(
+                    target = run_worker,
+                    args = (
+                            self.worker_cls,
+                            shard_id,
+                            child_sock,
+                            gateway_socks,
+                            self.placement,
+                            self._shard_rooms[shard_id],
+                            self._shard_objects[shard_id],
+                    ),
+                    daemon = True,
+            )
+            process.start()
+            child_sock.close()
+            reader, writer = await asyncio.open_connection(sock = parent_sock)
+            self.processes.append(process)
+            self.writers.append(writer)
+            self._readers.append(asyncio.get_running_loop().create_task(self.read_shard(shard_id, reader)))
+
+    async def stop_shards(self):
+        for task in self._readers:
+            task.cancel()
+        for shard_id, writer in enumerate(self.writers):
+            if shard_id not in self._down:
+                with contextlib.suppress(ConnectionError):
+                    await write_message(writer, None)
+            writer.close()
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        for pending in self._pending:
+            for future in pending.values():
+                future.cancel()
+            pending.clear()
+        self._readers.clear()
+        self.writers.clear()
+        self.processes.clear()
+
+    async def start(self):
+        await self.start_shards()
+        try:
+            await super().start()
+        finally:
+            await self.stop_shards()
+
+    async def read_shard(self, shard_id: ShardId, reader: asyncio.StreamReader):
+        try:
+            while True:
+                request_id, *reply = await read_message(reader)
+                if (future := self._pending[shard_id].pop(request_id, None)) and not future.done():
+                    future.set_result(reply)
+        except Exception as e:
+            # a closed socket and an undecodable reply alike leave the shard unusable
+            self.shard_down(shard_id, e)
+
+    def shard_down(self, shard_id: ShardId, reason: BaseException = None):
+        """Fails everything waiting on the shard and tells the players stuck there"""
+        logger.error(f"Shard {shard_id} went down: {reason!r}")
+        self._down.add(shard_id)
+        for future in self._pending[shard_id].values():
+            if not future.done():
+                future.set_exception(ShardError(f"Shard {shard_id} is down"))
+        self._pending[shard_id].clear()
+        for client_name, room_id in list(self.locations.items()):
+            if self.placement.get(room_id) == shard_id and client_name in self.clients:
+                self.send_message(client_name, "The area you are in has gone offline.")
+
+    async def request(
+            self,
+            room_id: RoomId,
+            kind: str,
+            client_name: ClientName,
+            payload: typing.Any = None,
+    ) -> typing.Tuple[ServerResponse, RoomId | None, ObjectState | None]:
+        if (shard_id := self.placement.get(room_id)) is None:
+            raise ShardError(f"No shard owns room {room_id}")
+        if shard_id in self._down:
+            raise ShardError(f"Shard {shard_id} is down")
+        request_id = next(self._request_ids)
+        future = self._pending[shard_id][request_id] = asyncio.get_running_loop().create_future()
+        try:
+            await write_message(self.writers[shard_id], (kind, request_id, client_name, room_id, payload))
+        except ConnectionError as e:
+            self._pending[shard_id].pop(request_id, None)
+            raise ShardError(f"Shard {shard_id} is unreachable") from e
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        except asyncio.TimeoutError as e:
+            raise ShardError(f"Shard {shard_id} did not answer {kind!r} for {client_name} in time") from e
+        finally:
+            self._pending[shard_id].pop(request_id, None)
+
+    async def enter(self, client_name: ClientName, room_id: RoomId, state: ObjectState) -> ServerResponse:
+        response, room_id, _ = await self.request(room_id, "enter", client_name, state)
+        if room_id is None:
+            raise ShardError(f"Entering {client_name} failed: {response}")
+        if client_name not in self.clients:
+            # disconnected while entering, nobody is left to take the player back out
+            await self.request(room_id, "leave", client_name)
+        else:
+            self.locations[client_name] = room_id
+        return response
+
+    async def on_connect(self, client_name: ClientName):
+        player = Player()
+        player.player_name = client_name
+        try:
+            self.send_message(client_name, await self.enter(client_name, self.spawn_room, object_state(player)))
+        except ShardError:
+            logger.exception(f"Could not spawn {client_name}")
+            self.send_message(client_name, "The world is unavailable right now.")
+
+    async def on_disconnect(self, client_name: ClientName):
+        if (moving := self._moving.get(client_name)) is not None:
+            await asyncio.shield(moving)
+        if (room_id := self.locations.pop(client_name, None)) is not None:
+            with contextlib.suppress(ShardError):
+                await self.request(room_id, "leave", client_name)
+
+    async def handle_message(self, client_name: ClientName, message: ClientMessage) -> ServerResponse:
+        if message.split(" ", 1)[0] in self.commands:
+            return await super().handle_message(client_name, message)
+        if (room_id := self.locations.get(client_name)) is None:
+            return "You are not in the world."
+        # ordered commands are the only ones that move players, on_disconnect waits for them to settle
+        moving = self.is_ordered(message)
+        if moving:
+            self._moving[client_name] = done = asyncio.get_running_loop().create_future()
+        try:
+            return await self.route(client_name, room_id, message)
+        except ShardError:
+            logger.exception(f"Routing {message!r} for {client_name} failed")
+            return "That part of the world is unavailable right now."
+        finally:
+            if moving:
+                self._moving.pop(client_name, None)
+                done.set_result(None)
+
+    async def route(self, client_name: ClientName, room_id: RoomId, message: ClientMessage) -> ServerResponse:
+        response, new_room, handoff = await self.request(room_id, "command", client_name, message)
+        if handoff is None:
+            if new_room is not None and client_name in self.locations:
+                self.locations[client_name] = new_room
+            return response
+        try:
+            return f"{response}\n{await self.enter(client_name, new_room, handoff)}"
+        except ShardError:
+            logger.exception(f"Handing {client_name} over to {new_room} failed")
+        return f"You can't go that way right now.\n{await self.enter(client_name, room_id, handoff)}"
+
+
+__all__ = [
+        "ShardError",
+        "ShardWorker",
+        "ShardedMudServer",
+        "partition_rooms",
+        "object_state",
+        "restore_object",
+]
@@ -0,0 +1,77 @@
+import json
+import typing
+
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+from game.objects.base import BaseObject
+
+# clients that don't ask for a subprotocol get plain text, one frame per message
+JSON_PROTOCOL = "mudpy.json"
+SUBPROTOCOLS = (JSON_PROTOCOL,)
+
+DeflateSettings = typing.Dict[str, typing.Any]
+Message = typing.Dict[str, typing.Any]
+
+# same as the websockets defaults, see ServerPerMessageDeflateFactory for the available keys
+DEFAULT_DEFLATE: DeflateSettings = {
+        "server_max_window_bits": 12,
+        "client_max_window_bits": 12,
+        "compress_settings"     : {"memLevel": 5},
+}
+
+
+def _default(obj):
+    if isinstance(obj, BaseObject):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+encoder = json.JSONEncoder(separators = (",", ":"), ensure_ascii = False, default = _default)
+
+
+def encode(data: typing.Any) -> str:
+    return encoder.encode(data)
+
+
+def structure(message: str | Message, type: str) -> Message:
+    """Wraps a plain string into a message of the given type, dicts are passed through as they are"""
+    if isinstance(message, dict):
+        return message
+    return {"type": type, "text": message}
+
+
+def render_text(message: str | Message) -> str:
+    if isinstance(message, dict):
+        return message["text"] if "text" in message else encode(message)
+    return message
+
+
+def decode_command(raw: str | bytes) -> str:
+    """Accepts either a bare command string or `{"type": "command", "text": ...}`"""
+    if isinstance(raw, bytes):
+        raw = raw.decode(errors = "replace")
+    if raw.startswith("{"):
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            return raw
+        return str(data.get("text", ""))
+    return raw
+
+
+def deflate_extensions(settings: DeflateSettings | None) -> typing.List[ServerPerMessageDeflateFactory]:
+    if settings is None:
+        return []
+    return [ServerPerMessageDeflateFactory(**settings)]
+
+
+__all__ = [
+        "JSON_PROTOCOL",
+        "SUBPROTOCOLS",
+        "DEFAULT_DEFLATE",
+        "encode",
+        "structure",
+        "render_text",
+        "decode_command",
+        "deflate_extensions",
+]
@@ -0,0 +1,218 @@
+import asyncio
+import collections
+import logging
+import time
+import typing
+
+SessionName = str
+SessionMessage = str
+QueuedMessage = typing.Tuple[bool, SessionMessage]
+
+Dispatch = typing.Callable[["Session", SessionMessage], typing.Awaitable[None]]
+IsOrdered = typing.Callable[[SessionMessage], bool]
+
+logger = logging.getLogger(__name__)
+
+# refill is computed from large monotonic timestamps, so a token that is due can come out a hair short
+TOKEN_EPSILON = 1e-9
+
+
+class TokenBucket:
+    """Refills at `rate` tokens per second up to `capacity`, one token is spent per command"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"Invalid token bucket rate {rate} or capacity {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, now: float = None) -> bool:
+        self.refill(now)
+        if self.tokens >= 1 - TOKEN_EPSILON:
+            self.tokens = max(0.0, self.tokens - 1)
+            return True
+        return False
+
+    def delay(self) -> float:
+        """Seconds until the next token is available"""
+        return max(0.0, (1 - TOKEN_EPSILON - self.tokens) / self.rate)
+
+
+class Session:
+    __slots__ = (
+            "name",
+            "client",
+            "queue",
+            "head",
+            "bucket",
+            "in_flight",
+            "ordered_in_flight",
+            "scheduled",
+            "closed",
+    )
+
+    def __init__(
+            self,
+            name: SessionName,
+            client: typing.Any,
+            queue_size: int,
+            bucket: TokenBucket | None,
+    ):
+        self.name = name
+        self.client = client
+        self.queue: asyncio.Queue[QueuedMessage] = asyncio.Queue(maxsize = queue_size)
+        self.head: QueuedMessage | None = None
+        self.bucket = bucket
+        self.in_flight = 0
+        self.ordered_in_flight = False
+        self.scheduled = False
+        self.closed = False
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r}, in_flight={self.in_flight}, queued={self.queue.qsize()})"
+
+    def has_pending(self) -> bool:
+        return self.head is not None or not self.queue.empty()
+
+
+class FairScheduler:
+    """Round-robins queued commands across sessions.
+
+    Each pass hands at most one command per session to `dispatch`, so a client with a deep queue
+    only ever gets its turn like everyone else. A session is skipped for the pass when its token
+    bucket is empty, when it already has `max_in_flight` commands running, or when an ordered
+    command is involved: ordered commands wait for the session to drain and nothing else from that
+    session starts until they finish.
+    """
+
+    def __init__(
+            self,
+            dispatch: Dispatch,
+            *,
+            is_ordered: IsOrdered = lambda message: False,
+            queue_size: int = 32,
+            max_in_flight: int = 4,
+            rate: float | None = 5.0,
+            burst: int = 10,
+    ):
+        if max_in_flight < 1:
+            raise ValueError(f"Invalid max in flight {max_in_flight}")
+        self.dispatch = dispatch
+        self.is_ordered = is_ordered
+        self.queue_size = queue_size
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.burst = burst
+        self.sessions: typing.Dict[SessionName, Session] = {}
+        self._ready: typing.Deque[Session] = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._tasks: typing.Set[asyncio.Task] = set()
+        self._runner: asyncio.Task | None = None
+
+    def start(self) -> asyncio.Task:
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self.run())
+        return self._runner
+
+    def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+    def register(self, name: SessionName, client: typing.Any) -> Session:
+        bucket = TokenBucket(self.rate, self.burst) if self.rate else None
+        session = self.sessions[name] = Session(name, client, self.queue_size, bucket)
+        return session
+
+    def unregister(self, session: Session):
+        session.closed = True
+        if self.sessions.get(session.name) is session:
+            del self.sessions[session.name]
+
+    async def submit(self, session: Session, message: SessionMessage):
+        """Queues a message for the session, waiting for room if its queue is full"""
+        await session.queue.put((self.is_ordered(message), message))
+        if not session.scheduled:
+            session.scheduled = True
+            self._ready.append(session)
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            dispatched, delay = self._dispatch_round()
+            if dispatched:
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch_round(self) -> typing.Tuple[bool, float | None]:
+        dispatched = False
+        delay = None
+        now = time.monotonic()
+        for _ in range(len(self._ready)):
+            session = self._ready.popleft()
+            if session.closed or not session.has_pending():
+                session.scheduled = False
+                continue
+            if session.head is None:
+                session.head = session.queue.get_nowait()
+            ordered, message = session.head
+            if (
+                    session.ordered_in_flight
+                    or session.in_flight >= self.max_in_flight
+                    or (ordered and session.in_flight)
+            ):
+                # a finishing command wakes the scheduler back up
+                self._ready.append(session)
+                continue
+            if session.bucket is not None and not session.bucket.try_acquire(now):
+                wait = session.bucket.delay()
+                delay = wait if delay is None else min(delay, wait)
+                self._ready.append(session)
+                continue
+            session.head = None
+            self._start(session, ordered, message)
+            dispatched = True
+            if session.has_pending():
+                self._ready.append(session)
+            else:
+                session.scheduled = False
+        return dispatched, delay
+
+    def _start(self, session: Session, ordered: bool, message: SessionMessage):
+        session.in_flight += 1
+        if ordered:
+            session.ordered_in_flight = True
+        task = asyncio.get_running_loop().create_task(self._execute(session, ordered, message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, session: Session, ordered: bool, message: SessionMessage):
+        try:
+            await self.dispatch(session, message)
+        except Exception:
+            logger.exception(f"Unhandled error dispatching {message!r} for {session.name}")
+        finally:
+            session.in_flight -= 1
+            if ordered:
+                session.ordered_in_flight = False
+            self._wakeup.set()
+
+
+__all__ = [
+        "TokenBucket",
+        "Session",
+        "FairScheduler",
+]
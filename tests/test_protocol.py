@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+import websockets
+
+from game.server import MudServer
+from game.system import protocol
+
+
+def test_decode_command():
+    assert protocol.decode_command("look") == "look"
+    assert protocol.decode_command('{"type": "command", "text": "go north"}') == "go north"
+    assert protocol.decode_command("{not json") == "{not json"
+    assert protocol.decode_command(b"look \xff") == "look �"
+
+
+def test_structured_client_gets_batched_frames():
+    async def main():
+        server = MudServer("127.0.0.1", 0, flush_interval = 0.05)
+
+        @server.command("say")
+        async def say(server, client_name, message, args):
+            server.broadcast_message(" ".join(args))
+            return {"type": "said", "text": " ".join(args)}
+
+        async with server.serve() as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            async with websockets.connect(
+                    f"ws://127.0.0.1:{port}", subprotocols = [protocol.JSON_PROTOCOL]
+            ) as client:
+                await client.send("alice")
+                await client.send('{"type": "command", "text": "say hi"}')
+                return json.loads(await asyncio.wait_for(client.recv(), 5))
+
+    frame = asyncio.run(main())
+    assert sorted(frame, key = lambda m: m["type"]) == [
+            {"type": "broadcast", "text": "hi"},
+            {"type": "said", "text": "hi"},
+    ]
+
+
+def test_invalid_binary_frame_does_not_leak_client():
+    async def main():
+        server = MudServer("127.0.0.1", 0)
+        async with server.serve() as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as client:
+                await client.send("alice")
+                await client.send(b"\xff\xfe")
+                assert (await asyncio.wait_for(client.recv(), 5)).startswith("Command not found")
+            deadline = time.monotonic() + 5
+            while server.clients and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            return server.clients
+
+    assert asyncio.run(main()) == {}
+
+
+def test_server_built_outside_the_event_loop():
+    # the server is created before asyncio.run starts the loop it ends up serving on
+    server = MudServer("127.0.0.1", 0, rate_limit = None)
+
+    @server.command("say")
+    async def say(server, client_name, message, args):
+        server.broadcast_message(" ".join(args))
+
+    async def main():
+        async with server.serve() as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as text_client, websockets.connect(
+                    f"ws://127.0.0.1:{port}", subprotocols = [protocol.JSON_PROTOCOL]
+            ) as json_client:
+                await text_client.send("alice")
+                await json_client.send("bob")
+                while len(server.clients) < 2:
+                    await asyncio.sleep(0.01)
+                await text_client.send("say hi")
+                return (
+                        await asyncio.wait_for(text_client.recv(), 5),
+                        json.loads(await asyncio.wait_for(json_client.recv(), 5)),
+                )
+
+    assert asyncio.run(main()) == ("hi", [{"type": "broadcast", "text": "hi"}])
@@ -0,0 +1,204 @@
+import asyncio
+import statistics
+import time
+
+from game.server import MudServer
+from game.system.scheduler import FairScheduler, TokenBucket
+
+
+async def drain(scheduler: FairScheduler, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while any(s.has_pending() or s.in_flight for s in scheduler.sessions.values()):
+        assert time.monotonic() < deadline, "scheduler did not drain"
+        await asyncio.sleep(0.005)
+
+
+def test_token_bucket_refills_at_rate():
+    # large timestamps are where float rounding leaves a due token a hair short
+    for now in (time.monotonic(), 1_000_000.123, 987_654_321.5):
+        bucket = TokenBucket(rate = 10, capacity = 2)
+        bucket.updated = now
+        assert bucket.try_acquire(now)
+        assert bucket.try_acquire(now)
+        assert not bucket.try_acquire(now)
+        assert abs(bucket.delay() - 0.1) < 1e-6
+        assert not bucket.try_acquire(now + 0.05)
+        assert bucket.try_acquire(now + 0.1)
+        assert not bucket.try_acquire(now + 0.1)
+        # never refills past capacity
+        bucket.refill(now + 100)
+        assert bucket.tokens == 2
+
+
+def test_round_robin_across_sessions():
+    async def main():
+        order = []
+
+        async def dispatch(session, message):
+            order.append(session.name)
+
+        scheduler = FairScheduler(dispatch, rate = None, max_in_flight = 1)
+        a = scheduler.register("a", None)
+        b = scheduler.register("b", None)
+        for _ in range(5):
+            await scheduler.submit(a, "x")
+        for _ in range(5):
+            await scheduler.submit(b, "x")
+        scheduler.start()
+        await drain(scheduler)
+        scheduler.stop()
+        return order
+
+    assert asyncio.run(main()) == ["a", "b"] * 5
+
+
+def test_rate_limit_throttles_session():
+    async def main():
+        dispatched = []
+
+        async def dispatch(session, message):
+            dispatched.append(time.monotonic())
+
+        scheduler = FairScheduler(dispatch, rate = 20, burst = 2)
+        session = scheduler.register("a", None)
+        for _ in range(6):
+            await scheduler.submit(session, "x")
+        start = time.monotonic()
+        scheduler.start()
+        await drain(scheduler)
+        scheduler.stop()
+        return [t - start for t in dispatched]
+
+    times = asyncio.run(main())
+    assert len(times) == 6
+    # the burst goes straight out, the remaining four need a token each at 20/s
+    assert times[1] < 0.05
+    assert times[-1] >= 0.18
+
+
+def test_max_in_flight_cap():
+    async def main():
+        running = peak = 0
+
+        async def dispatch(session, message):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        scheduler = FairScheduler(dispatch, rate = None, max_in_flight = 3)
+        session = scheduler.register("a", None)
+        for _ in range(12):
+            await scheduler.submit(session, "x")
+        scheduler.start()
+        await drain(scheduler)
+        scheduler.stop()
+        return peak
+
+    assert asyncio.run(main()) == 3
+
+
+def test_ordered_commands_never_overlap():
+    async def main():
+        active = []
+        overlaps = []
+
+        async def dispatch(session, message):
+            if message == "go" and active or "go" in active:
+                overlaps.append((message, list(active)))
+            active.append(message)
+            await asyncio.sleep(0.01)
+            active.remove(message)
+
+        scheduler = FairScheduler(dispatch, is_ordered = lambda m: m == "go", rate = None, max_in_flight = 4)
+        session = scheduler.register("a", None)
+        for message in ("look", "look", "go", "look", "look", "go", "look"):
+            await scheduler.submit(session, message)
+        scheduler.start()
+        await drain(scheduler)
+        scheduler.stop()
+        return overlaps
+
+    assert asyncio.run(main()) == []
+
+
+def test_failing_command_does_not_stall_session():
+    async def main():
+        handled = []
+
+        async def dispatch(session, message):
+            if message == "boom":
+                raise RuntimeError("boom")
+            handled.append(message)
+
+        scheduler = FairScheduler(dispatch, is_ordered = lambda m: m == "boom", rate = None)
+        session = scheduler.register("a", None)
+        for message in ("boom", "look", "boom", "look"):
+            await scheduler.submit(session, message)
+        scheduler.start()
+        await drain(scheduler)
+        scheduler.stop()
+        return handled, session
+
+    handled, session = asyncio.run(main())
+    assert handled == ["look", "look"]
+    assert session.in_flight == 0 and not session.ordered_in_flight
+
+
+def test_flooding_session_does_not_hurt_others():
+    async def main():
+        latencies = []
+
+        async def dispatch(session, message):
+            await asyncio.sleep(0.002)
+            if session.name != "flood":
+                latencies.append(time.monotonic() - float(message))
+
+        scheduler = FairScheduler(dispatch, queue_size = 8, max_in_flight = 2, rate = 50, burst = 10)
+        scheduler.start()
+        flood = scheduler.register("flood", None)
+
+        async def flooder():
+            while True:
+                await scheduler.submit(flood, "0")
+
+        async def player(name):
+            session = scheduler.register(name, None)
+            for _ in range(20):
+                await scheduler.submit(session, str(time.monotonic()))
+                await asyncio.sleep(0.01)
+
+        flooding = asyncio.create_task(flooder())
+        await asyncio.gather(*(player(f"player{i}") for i in range(10)))
+        await asyncio.sleep(0.05)
+        flooding.cancel()
+        scheduler.stop()
+        return latencies
+
+    latencies = asyncio.run(main())
+    assert len(latencies) == 200
+    assert statistics.quantiles(latencies, n = 100)[98] < 0.05
+
+
+def test_server_replies_when_command_raises():
+    class FakeClient:
+        def __init__(self):
+            self.sent = []
+
+        async def send(self, frame):
+            self.sent.append(frame)
+
+    async def main():
+        server = MudServer("127.0.0.1", 0)
+
+        @server.command("boom")
+        async def boom(server, client_name, message, args):
+            raise RuntimeError("boom")
+
+        client = FakeClient()
+        session = server.scheduler.register("alice", client)
+        await server.dispatch(session, "boom")
+        return client.sent
+
+    assert asyncio.run(main()) == ["Something went wrong."]
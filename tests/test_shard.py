@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import time
+import typing
+
+import websockets
+
+from game.objects.world import Room
+from game.shard import ShardedMudServer, ShardWorker
+
+
+class SlowEnterWorker(ShardWorker):
+    """Holds every arrival on shard 1 long enough to disconnect in the middle of a handoff"""
+
+    async def handle_request(self, request):
+        if request[0] == "enter" and self.shard_id == 1:
+            await asyncio.sleep(0.5)
+        return await super().handle_request(request)
+
+
+class MisbehavingWorker(ShardWorker):
+    """Never answers "hang" and answers "corrupt" with a frame that doesn't unpickle"""
+
+    async def respond(self, writer, request):
+        match request[4]:
+            case "corrupt":
+                writer.write((2).to_bytes(4, "big") + b"no")
+            case "hang":
+                pass
+            case _:
+                await super().respond(writer, request)
+
+
+def build_world() -> typing.Tuple[Room, Room]:
+    west, east = Room(), Room()
+    west.name, east.name = "the west room", "the east room"
+    west.exits = {"east": east.uuid, "void": "nowhere"}
+    east.exits = {"west": west.uuid}
+    return west, east
+
+
+@contextlib.asynccontextmanager
+async def running(worker_cls = ShardWorker, **kwargs):
+    west, east = build_world()
+    server = ShardedMudServer(
+            "127.0.0.1",
+            0,
+            [west, east],
+            spawn_room = west.uuid,
+            placement = {west.uuid: 0, east.uuid: 1},
+            worker_cls = worker_cls,
+            **kwargs
+    )
+    await server.start_shards()
+    try:
+        async with server.serve() as ws_server:
+            yield server, ws_server.sockets[0].getsockname()[1], west, east
+    finally:
+        await server.stop_shards()
+
+
+async def connect(port: int, name: str) -> typing.Tuple[websockets.WebSocketClientProtocol, str]:
+    client = await websockets.connect(f"ws://127.0.0.1:{port}")
+    await client.send(name)
+    return client, await asyncio.wait_for(client.recv(), 5)
+
+
+async def command(client: websockets.WebSocketClientProtocol, message: str) -> str:
+    await client.send(message)
+    return await asyncio.wait_for(client.recv(), 5)
+
+
+async def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        await asyncio.sleep(0.01)
+
+
+def test_look_move_across_shards_and_disconnect():
+    async def main():
+        async with running() as (server, port, west, east):
+            bob, spawn = await connect(port, "bob")
+            assert "the west room" in spawn
+            assert "bob is here" in await command(bob, "look")
+
+            response = await command(bob, "go east")
+            assert response.startswith("You go east.") and "the east room" in response
+            assert server.locations["bob"] == east.uuid
+
+            response = await command(bob, "go west")
+            assert "the west room" in response and "bob is here" in response
+            assert server.locations["bob"] == west.uuid
+
+            await bob.close()
+            await wait_until(lambda: "bob" not in server.locations)
+            response, _, _ = await server.request(west.uuid, "command", "bob", "look")
+            assert response == "You are not here."
+
+    asyncio.run(main())
+
+
+def test_disconnect_during_handoff_leaves_no_ghost():
+    async def main():
+        async with running(SlowEnterWorker) as (server, port, west, east):
+            bob, _ = await connect(port, "bob")
+            await bob.send("go east")
+            await asyncio.sleep(0.1)
+            await bob.close()
+            await wait_until(lambda: not server._moving and not server.clients)
+            assert server.locations == {}
+            response, _, _ = await server.request(east.uuid, "command", "bob", "look")
+            assert response == "You are not here."
+
+            alice, _ = await connect(port, "alice")
+            response = await command(alice, "go east")
+            assert "There are 1 players here." in response and "bob" not in response
+            await alice.close()
+
+    asyncio.run(main())
+
+
+def test_exit_to_unknown_room_keeps_player():
+    async def main():
+        async with running() as (server, port, west, east):
+            bob, _ = await connect(port, "bob")
+            assert await command(bob, "go void") == "That way leads nowhere."
+            assert "bob is here" in await command(bob, "look")
+            assert server.locations["bob"] == west.uuid
+            await bob.close()
+
+    asyncio.run(main())
+
+
+def test_dead_shard_fails_requests_and_returns_handoffs():
+    async def main():
+        async with running() as (server, port, west, east):
+            bob, _ = await connect(port, "bob")
+            alice, _ = await connect(port, "alice")
+            await command(alice, "go east")
+
+            server.processes[1].kill()
+            assert await asyncio.wait_for(alice.recv(), 5) == "The area you are in has gone offline."
+            assert await command(alice, "look") == "That part of the world is unavailable right now."
+
+            # the handoff to the dead shard fails and bob is put back where he was
+            response = await command(bob, "go east")
+            assert response.startswith("You can't go that way right now.") and "the west room" in response
+            assert server.locations["bob"] == west.uuid
+            assert "bob is here" in await command(bob, "look")
+            await bob.close()
+            await alice.close()
+
+    asyncio.run(main())
+
+
+def test_duplicate_name_is_rejected():
+    async def main():
+        async with running() as (server, port, west, east):
+            bob, _ = await connect(port, "bob")
+            impostor = await websockets.connect(f"ws://127.0.0.1:{port}")
+            await impostor.send("bob")
+            await asyncio.wait_for(impostor.wait_closed(), 5)
+            assert impostor.close_reason == "That name is already taken."
+
+            assert "bob is here" in await command(bob, "look")
+            assert list(server.clients) == ["bob"] and server.locations["bob"] == west.uuid
+            await bob.close()
+
+    asyncio.run(main())
+
+
+def test_workers_exit_when_gateway_dies():
+    async def main():
+        async with running() as (server, port, west, east):
+            # drop the gateway's ends without the polite stop message
+            for writer in server.writers:
+                writer.transport.abort()
+            await wait_until(lambda: not any(process.is_alive() for process in server.processes))
+
+    asyncio.run(main())
+
+
+def test_bad_or_missing_replies_fail_the_request():
+    async def main():
+        async with running(MisbehavingWorker, request_timeout = 0.5) as (server, port, west, east):
+            bob, _ = await connect(port, "bob")
+            assert await command(bob, "hang") == "That part of the world is unavailable right now."
+            assert not server._pending[0]
+            assert "bob is here" in await command(bob, "look")
+
+            await bob.send("corrupt")
+            replies = {await asyncio.wait_for(bob.recv(), 5) for _ in range(2)}
+            assert replies == {
+                    "The area you are in has gone offline.",
+                    "That part of the world is unavailable right now.",
+            }
+            assert server._down == {0}
+            assert await command(bob, "look") == "That part of the world is unavailable right now."
+            await bob.close()
+
+    asyncio.run(main())